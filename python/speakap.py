@@ -1,26 +1,64 @@
 # -*- coding: utf-8 -*-
 
 import base64
+import calendar
+import functools
 import hashlib
 import hmac
 import httplib
 import iso8601
 import json
 import logging
-
-from datetime import datetime;
-from datetime import timedelta;
+import socket
+import time
 
 try:
     from google.appengine.api import urlfetch
 except ImportError:
     urlfetch = None
 
+# App Engine only provides ssl when the application enables it.
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+try:
+    import certifi
+    import urllib3
+except ImportError:
+    urllib3 = None
+
 from urllib import quote
 
 
 SIGNATURE_WINDOW_SIZE = 1; # minute
 
+_SIGNATURE_WINDOW_SECONDS = SIGNATURE_WINDOW_SIZE * 60
+
+_quote = functools.partial(quote, safe="~")
+
+LOG = logging.getLogger(__name__)
+
+# hashlib uses OpenSSL for SHA-256; versions before 1.1.0 lack the SHA extension (SHA-NI) code
+# paths, which makes signature validation noticeably slower.
+if ssl and ssl.OPENSSL_VERSION_INFO < (1, 1, 0):
+    LOG.warning("%s is older than 1.1.0; hardware-accelerated SHA-256 is unavailable",
+                ssl.OPENSSL_VERSION)
+
+
+def _connection_error(error):
+    """
+    Converts a urllib3 error into the socket.error or httplib.HTTPException that the plain httplib
+    code path raises in the same situation.
+    """
+    if isinstance(error, urllib3.exceptions.MaxRetryError) and error.reason:
+        error = error.reason
+    if isinstance(error, (urllib3.exceptions.ProtocolError, urllib3.exceptions.SSLError,
+                          urllib3.exceptions.TimeoutError)):
+        return socket.error(str(error))
+    return httplib.HTTPException(str(error))
+
 
 class SignatureValidationError(Exception):
     """
@@ -44,16 +82,10 @@ def signed_request(params):
     Note this method does not calculate a signature; it simply generates the signed request from
     the parameters including the signature.
     """
-    has_signature = False
-    keys = params.keys()
-    if "signature" in keys:
-        has_signature = True
-        keys.remove("signature")
-    keys.sort()
-    if has_signature:
+    keys = sorted(key for key in params if key != "signature")
+    if "signature" in params:
         keys.append("signature")
-    query_string = "&".join(quote(key, "~") + "=" + quote(params[key], "~") for key in keys)
-    return query_string
+    return "&".join([_quote(key) + "=" + _quote(params[key]) for key in keys])
 
 
 class API:
@@ -87,11 +119,15 @@ class API:
       an error. The error variable is None in case of success, but is an object containing code
       and message properties in case of an error.
 
+      If urllib3 and certifi are installed, connections to the Speakap API are kept alive and
+      reused between requests, and the SSL certificate of the API service is validated.
+
       WARNING: If you use this class to make requests on any other platform than Google App Engine,
-               the SSL certificate of the Speakap API service is not confirmed, leaving you
-               vulnerable to man-in-the-middle attacks. This is due to a limitation of the SSL
-               support in the Python framework. You are strongly advised to take your own
-               precautions to make sure the certificate is valid.
+               and urllib3 and certifi are not installed, the SSL certificate of the Speakap API
+               service is not confirmed, leaving you vulnerable to man-in-the-middle attacks. This
+               is due to a limitation of the SSL support in the Python framework. You are strongly
+               advised to install urllib3 and certifi, or to take your own precautions to make
+               sure the certificate is valid.
     """
     def __init__(self, config):
         self.scheme = config["scheme"]
@@ -100,6 +136,28 @@ class API:
         self.app_secret = config["app_secret"]
 
         self.access_token = "%s_%s" % (self.app_id, self.app_secret)
+        self._headers = {"Authorization": "Bearer " + self.access_token}
+
+        # Keyed HMAC state, copied for every signature check so the key setup is only done once.
+        secret = self.app_secret
+        if isinstance(secret, unicode):
+            secret = secret.encode("utf-8")
+        self._hmac_template = hmac.new(secret, "", hashlib.sha256)
+
+        if urlfetch or not urllib3:
+            self._pool = None
+        else:
+            # Requests are not retried once they have been sent, but a pooled connection may
+            # have to be re-established once.
+            pool_options = {
+                "maxsize": 8,
+                "retries": urllib3.Retry(total=1, connect=1, read=0, redirect=False)
+            }
+            if self.scheme == "https":
+                pool_options["cert_reqs"] = "CERT_REQUIRED"
+                pool_options["ca_certs"] = certifi.where()
+            self._pool = urllib3.connection_from_url(self.scheme + "://" + self.hostname,
+                                                     **pool_options)
 
     def delete(self, path):
         """
@@ -209,7 +267,7 @@ class API:
           else
               ... do something with error ...
         """
-        response = self._create_connection("PUT", path, json.dumps(data))
+        response = self._request("PUT", path, json.dumps(data))
         return self._handle_response(response)
 
     def validate_signature(self, params):
@@ -221,28 +279,70 @@ class API:
         Raises a SignatureValidationError if the signature doesn't match or the signed request is
         expired.
         """
+        self._validate_signature(params, time.time())
+
+    def validate_signatures(self, params_list):
+        """
+        Validates the signatures of multiple signed requests at once.
+
+        @param params_list List of objects containing the POST parameters of each signed request.
+
+        @return A list with, for every signed request in params_list, None if it is valid or a
+                SignatureValidationError describing why it is not.
+
+        Unlike validate_signature(), an invalid signed request doesn't stop the validation of the
+        remaining ones. All requests are checked against the same current time.
+        """
+        now = time.time()
+        errors = []
+        for params in params_list:
+            try:
+                self._validate_signature(params, now)
+                errors.append(None)
+            except SignatureValidationError as error:
+                errors.append(error)
+        return errors
+
+    def _validate_signature(self, params, now):
         if "signature" not in params:
             raise SignatureValidationError("Parameters did not include a signature")
 
-        signature = params["signature"]
+        if "issuedAt" not in params:
+            raise SignatureValidationError("Parameters did not include an issuedAt timestamp")
 
-        keys = params.keys()
-        keys.sort()
-        query_string = "&".join(quote(key, "~") + "=" + quote(params[key], "~") \
-                       for key in keys if key != "signature")
-        computed_hash = base64.b64encode(hmac.new(self.app_secret, query_string, hashlib.sha256)
-                                             .digest())
+        try:
+            issued_at = iso8601.parse_date(params["issuedAt"])
+        except (ValueError, iso8601.ParseError):
+            raise SignatureValidationError("Invalid issuedAt timestamp")
+        issued_at = calendar.timegm(issued_at.utctimetuple()) + issued_at.microsecond / 1e6
+        if now - issued_at > _SIGNATURE_WINDOW_SECONDS:
+            raise SignatureValidationError("Expired signature")
 
-        if computed_hash != signature:
+        # compare_digest() needs both sides to be byte strings; a signature that isn't ASCII can't
+        # be valid anyway.
+        signature = params["signature"]
+        if isinstance(signature, unicode):
+            try:
+                signature = signature.encode("ascii")
+            except UnicodeEncodeError:
+                signature = None
+
+        # Feed the query string into the HMAC one parameter at a time rather than joining it first;
+        # it is only materialized for the error message.
+        keys = sorted(key for key in params if key != "signature")
+        h = self._hmac_template.copy()
+        separator = ""
+        for key in keys:
+            h.update(separator + _quote(key) + "=" + _quote(params[key]))
+            separator = "&"
+        computed_hash = base64.b64encode(h.digest())
+
+        if not isinstance(signature, str) or not hmac.compare_digest(computed_hash, signature):
+            query_string = "&".join([_quote(key) + "=" + _quote(params[key]) for key in keys])
             raise SignatureValidationError("Invalid signature: " + query_string)
 
-        issued_at = iso8601.parse_date(params["issuedAt"])
-        expires_at = issued_at + timedelta(minutes=SIGNATURE_WINDOW_SIZE)
-        if datetime.utcnow() > expires_at.replace(tzinfo=None):
-            raise SignatureValidationError("Expired signature")
-
     def _request(self, method, path, data=None):
-        headers = {"Authorization": "Bearer " + self.access_token}
+        headers = self._headers
         if urlfetch:
             response = urlfetch.fetch(self.scheme + "://" + self.hostname + path,
                                       headers=headers,
@@ -251,6 +351,14 @@ class API:
                                       validate_certificate=True)
             status = response.status_code
             data = response.content
+        elif self._pool is not None:
+            try:
+                response = self._pool.urlopen(method, path, body=data, headers=headers,
+                                              redirect=False)
+            except urllib3.exceptions.HTTPError as error:
+                raise _connection_error(error)
+            status = response.status
+            data = response.data
         else:
             if self.scheme == "https":
                 connection = httplib.HTTPSConnection(self.hostname)
@@ -269,7 +377,7 @@ class API:
 
         try:
             json_result = json.loads(data)
-        except:
+        except (ValueError, TypeError):
             status = 400
             json_result = { "code": -1001, "message": "Unexpected Reply" }
 
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+
+import BaseHTTPServer
+import SocketServer
+import base64
+import calendar
+import hashlib
+import hmac
+import socket
+import threading
+import time
+import unittest
+import urlparse
+
+import speakap
+
+
+# Signed requests generated by the Speakap platform, shared with the PHP SDK tests.
+RAW_PAYLOADS = [
+    "appData=&issuedAt=2014-04-02T13%3A20%3A09.066%2B0000&locale=en-US&role=user&networkEID=08e1e1eadc000e6c&userEID=08e1e1eead0dc968&signature=lqWV60eaUcwhrVX%2FK7llLBzoTwYFh%2Fg78CR0TUHTPmA%3D",
+    "appData=&issuedAt=2014-04-02T13%3A22%3A09.100%2B0000&locale=en-US&role=user&networkEID=08e1e1eadc000e6c&userEID=08e1e1eead0dc968&signature=36fezwghQU7tub4FuSGXeT7ggczX95o1oZCp%2BRLR9Fk%3D",
+    "appData=&issuedAt=2014-04-02T13%3A22%3A35.352%2B0000&locale=en-US&role=user&networkEID=08e1e1eadc000e6c&userEID=08e1e1eead0dc968&signature=zVGVDMrO7Erm1KjBroVehRKeoeNCnIH6sEc5quX9kOo%3D",
+]
+
+
+def parse_payload(payload, decode=False):
+    params = dict(urlparse.parse_qsl(payload, keep_blank_values=True))
+    if decode:
+        params = dict((key.decode("ascii"), value.decode("ascii"))
+                      for key, value in params.items())
+    return params
+
+
+def sign(params, secret="secret"):
+    query_string = speakap.signed_request(params)
+    params = dict(params)
+    params["signature"] = base64.b64encode(hmac.new(secret, query_string, hashlib.sha256).digest())
+    return params
+
+
+def iso8601_from_now(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime(time.time() + seconds))
+
+
+def default_params(**overrides):
+    params = {
+        "appData": "",
+        "issuedAt": iso8601_from_now(0),
+        "locale": "en-US",
+        "role": "user",
+        "networkEID": "08e1e1eadc000e6c",
+        "userEID": "08e1e1eead0dc968",
+    }
+    params.update(overrides)
+    return params
+
+
+def create_api(app_secret="secret", scheme="https", hostname="api.speakap.io"):
+    return speakap.API({
+        "scheme": scheme,
+        "hostname": hostname,
+        "app_id": "000a000000000006",
+        "app_secret": app_secret
+    })
+
+
+class RawPayloadTest(unittest.TestCase):
+    """
+    Validates the fixed payloads, which are long expired, with an effectively unlimited window.
+    """
+    def setUp(self):
+        self.window_seconds = speakap._SIGNATURE_WINDOW_SECONDS
+        speakap._SIGNATURE_WINDOW_SECONDS = 9999999999
+
+    def tearDown(self):
+        speakap._SIGNATURE_WINDOW_SECONDS = self.window_seconds
+
+    def test_raw_payloads(self):
+        api = create_api("legless lizards")
+        for payload in RAW_PAYLOADS:
+            api.validate_signature(parse_payload(payload))
+
+    def test_unicode_raw_payloads(self):
+        api = create_api("legless lizards")
+        for payload in RAW_PAYLOADS:
+            api.validate_signature(parse_payload(payload, decode=True))
+
+    def test_unicode_secret(self):
+        api = create_api(u"legless lizards")
+        for payload in RAW_PAYLOADS:
+            api.validate_signature(parse_payload(payload, decode=True))
+
+    def test_invalid_secret(self):
+        api = create_api("secret")
+        for payload in RAW_PAYLOADS:
+            self.assertRaises(speakap.SignatureValidationError,
+                              api.validate_signature, parse_payload(payload, decode=True))
+
+    def test_non_ascii_signature(self):
+        params = parse_payload(RAW_PAYLOADS[0], decode=True)
+        params["signature"] = u"lqWV60eaUcwhrVX/K7llLBzoTwYFh/g78CR0TUHTPmé="
+        self.assertRaises(speakap.SignatureValidationError,
+                          create_api("legless lizards").validate_signature, params)
+
+    def test_non_string_signature(self):
+        params = parse_payload(RAW_PAYLOADS[0])
+        params["signature"] = None
+        self.assertRaises(speakap.SignatureValidationError,
+                          create_api("legless lizards").validate_signature, params)
+
+
+class ValidateSignatureTest(unittest.TestCase):
+
+    def test_valid_input(self):
+        api = create_api()
+        for seconds in (-58, -30, -1):
+            api.validate_signature(sign(default_params(issuedAt=iso8601_from_now(seconds))))
+
+    def test_expired(self):
+        api = create_api()
+        for seconds in (-61, -86400):
+            params = sign(default_params(issuedAt=iso8601_from_now(seconds)))
+            self.assertRaises(speakap.SignatureValidationError, api.validate_signature, params)
+
+    def test_fractional_issued_at(self):
+        # Expires 0.9 seconds later than it would if the milliseconds were dropped.
+        issued_at = time.gmtime(time.time() - 60)
+        params = sign(default_params(issuedAt=time.strftime("%Y-%m-%dT%H:%M:%S.900+0000", issued_at)))
+        now = calendar.timegm(issued_at) + 60.5
+        self.assertEqual(None, create_api()._validate_signature(params, now))
+
+    def test_invalid_secret(self):
+        params = sign(default_params(), "invalid secret")
+        self.assertRaises(speakap.SignatureValidationError, create_api().validate_signature, params)
+
+    def test_invalid_issued_at(self):
+        params = sign(default_params(issuedAt="garbage"))
+        self.assertRaises(speakap.SignatureValidationError, create_api().validate_signature, params)
+
+    def test_missing_signature(self):
+        self.assertRaises(speakap.SignatureValidationError,
+                          create_api().validate_signature, default_params())
+
+    def test_missing_issued_at(self):
+        params = default_params()
+        del params["issuedAt"]
+        self.assertRaises(speakap.SignatureValidationError,
+                          create_api().validate_signature, sign(params))
+
+
+class ValidateSignaturesTest(unittest.TestCase):
+
+    def test_mixed_batch(self):
+        params_list = [
+            sign(default_params()),
+            sign(default_params(issuedAt=iso8601_from_now(-120))),
+            sign(default_params(issuedAt="garbage")),
+            sign(default_params(), "invalid secret"),
+            default_params(),
+            sign(default_params(userEID=u"08e1e1eead0dc969")),
+        ]
+        errors = create_api().validate_signatures(params_list)
+
+        self.assertEqual(len(params_list), len(errors))
+        self.assertEqual(None, errors[0])
+        for error in errors[1:5]:
+            self.assertTrue(isinstance(error, speakap.SignatureValidationError))
+        self.assertEqual(None, errors[5])
+
+    def test_empty_batch(self):
+        self.assertEqual([], create_api().validate_signatures([]))
+
+
+class HandleResponseTest(unittest.TestCase):
+
+    def test_json_reply(self):
+        self.assertEqual(({"EID": "08e1e1eadc000e6c"}, None),
+                         create_api()._handle_response((200, '{"EID": "08e1e1eadc000e6c"}')))
+
+    def test_error_reply(self):
+        self.assertEqual((None, {"code": 1234, "message": "Not found"}),
+                         create_api()._handle_response((404, '{"code": 1234, "message": "Not found"}')))
+
+    def test_non_json_reply(self):
+        self.assertEqual((None, {"code": -1001, "message": "Unexpected Reply"}),
+                         create_api()._handle_response((200, "<html>Bad Gateway</html>")))
+
+    def test_empty_reply(self):
+        self.assertEqual((None, {"code": -1001, "message": "Unexpected Reply"}),
+                         create_api()._handle_response((200, None)))
+
+
+class PutTest(unittest.TestCase):
+
+    def test_put(self):
+        requests = []
+        api = create_api()
+        api._request = lambda *args: requests.append(args) or (200, '{"EID": "08e1e1eadc000e6c"}')
+
+        (json_result, error) = api.put("/networks/08e1e1eadc000e6c/", {"name": "Speakap"})
+
+        self.assertEqual([("PUT", "/networks/08e1e1eadc000e6c/", '{"name": "Speakap"}')], requests)
+        self.assertEqual(({"EID": "08e1e1eadc000e6c"}, None), (json_result, error))
+
+
+class RecordingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append((self.command, self.path, self.client_address,
+                                     self.headers.getheader("Authorization")))
+        body = '{"EID": "08e1e1eadc000e6c"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+@unittest.skipUnless(speakap.urllib3, "urllib3 and certifi are not installed")
+class PooledRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = RecordingServer(("127.0.0.1", 0), RecordingHandler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.api = create_api(scheme="http", hostname="127.0.0.1:%d" % self.server.server_port)
+
+    def tearDown(self):
+        self.api._pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connection(self):
+        for _ in range(2):
+            (json_result, error) = self.api.get("/networks/08e1e1eadc000e6c/")
+            self.assertEqual({"EID": "08e1e1eadc000e6c"}, json_result)
+            self.assertEqual(None, error)
+
+        self.assertEqual(2, len(self.server.requests))
+        (method, path, client_address, authorization) = self.server.requests[0]
+        self.assertEqual(("GET", "/networks/08e1e1eadc000e6c/"), (method, path))
+        self.assertEqual("Bearer 000a000000000006_secret", authorization)
+        self.assertEqual(client_address, self.server.requests[1][2])
+
+    def test_connection_error(self):
+        closed_socket = socket.socket()
+        closed_socket.bind(("127.0.0.1", 0))
+        port = closed_socket.getsockname()[1]
+        closed_socket.close()
+
+        api = create_api(scheme="http", hostname="127.0.0.1:%d" % port)
+        self.assertRaises(socket.error, api.get, "/networks/")
+
+
+if __name__ == "__main__":
+    unittest.main()